@@ -19,32 +19,126 @@ Usage Examples:
   python3 get_measurement_ids.py --type traceroute --min-id 60000000 --prompt-key
 """
 import argparse
+import contextlib
 import csv
+import functools
 import getpass
+import hashlib
+import heapq
+import io
 import json
 import logging
+import math
+import operator
 import os
+import queue
+import shelve
+import socket
+import stat
 import sys
+import threading
 import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.response import HTTPResponse
 from urllib3.util import Retry
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+if orjson is not None:
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+else:
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        # Match orjson's compact, UTF-8 encoded output
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
 # Define API constants
 DEFAULT_URL = "https://atlas.ripe.net/api/v2/measurements/"
 ANCHOR_URL = "https://atlas.ripe.net/api/v2/anchor-measurements/"
+OUT_BUFFER_SIZE = 1 << 20  # Bytes of output buffered between writes
+PARTITION_LEAD_PAGES = 4  # Pages a partition may fetch ahead of its turn
+
+
+def tcp_socket_options(fastopen=False):
+    """
+    Builds the socket options used for new connections to the API.
+
+    On top of urllib3's defaults (TCP_NODELAY), SO_KEEPALIVE stops idle pooled
+    connections from being dropped silently. Optionally, on Linux, TCP Fast
+    Open lets reconnects to a host seen before send the TLS handshake in the
+    SYN. TFO is only used if the kernel accepts the option, as a rejected
+    option would make every connection attempt fail.
+
+    With TFO, connect() returns at once and the connection is only really
+    made when data is first sent, so the HTTP timeout no longer bounds the
+    connect phase and connection failures surface during the TLS handshake.
+
+    Args:
+        fastopen (bool): Try to enable TCP Fast Open. Defaults to False.
+
+    Returns:
+        list: (level, option, value) tuples for urllib3's socket_options.
+    """
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+
+    # Not exported by the socket module; 30 is its value in linux/tcp.h
+    tfo_connect = getattr(socket, "TCP_FASTOPEN_CONNECT", 30 if sys.platform.startswith("linux") else None)
+    if fastopen and tfo_connect is not None:
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            probe.setsockopt(socket.IPPROTO_TCP, tfo_connect, 1)
+            options.append((socket.IPPROTO_TCP, tfo_connect, 1))
+        except OSError:
+            pass
+        finally:
+            probe.close()
+    return options
+
+
+class SocketOptionsAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter that opens its connections with the given socket options.
+    """
+
+    def __init__(self, *args, socket_options=None, **kwargs):
+        self.socket_options = socket_options
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.socket_options is not None:
+            kwargs["socket_options"] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
 
 
-def make_session(total_retries=5, backoff_factor=0.5, ua="atlas-fetch/1.0", api_key=None):
+def make_session(total_retries=5, backoff_factor=0.5, ua="atlas-fetch/1.0", api_key=None, pool_size=10,
+                 tcp_fastopen=False):
     """
     Creates a requests.Session with retry settings and optional API key auth.
 
+    All requests go to a single host, so the adapter keeps one connection pool
+    sized for the number of concurrent workers. Connections are kept alive and
+    reused across pages rather than re-doing the TCP and TLS handshakes.
+
     Args:
         total_retries (int): The total number of retries to allow.
         backoff_factor (float): A factor to apply between retry attempts.
         ua (str): The User-Agent string for the request.
         api_key (str, optional): The RIPE Atlas API key. Defaults to None.
+        pool_size (int): The maximum number of pooled keep-alive connections.
+        tcp_fastopen (bool): Try to open connections with TCP Fast Open. Defaults to False.
 
     Returns:
         requests.Session: A configured session object.
@@ -57,13 +151,22 @@ def make_session(total_retries=5, backoff_factor=0.5, ua="atlas-fetch/1.0", api_
         raise_on_status=False,
     )
     s = requests.Session()
-    headers = {"User-Agent": ua, "Accept": "application/json"}
+    headers = {
+        "User-Agent": ua,
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    }
     if api_key:
         headers["Authorization"] = f"Key {api_key}"
 
     s.headers.update(headers)
-    s.mount("https://", HTTPAdapter(max_retries=retries))
-    s.mount("http://", HTTPAdapter(max_retries=retries))
+    # pool_block makes extra threads wait for a free connection instead of
+    # opening throwaway ones that are discarded once the pool is full.
+    adapter_kwargs = dict(max_retries=retries, pool_connections=1, pool_maxsize=pool_size, pool_block=True,
+                          socket_options=tcp_socket_options(fastopen=tcp_fastopen))
+    s.mount("https://", SocketOptionsAdapter(**adapter_kwargs))
+    s.mount("http://", SocketOptionsAdapter(**adapter_kwargs))
     return s
 
 
@@ -85,14 +188,27 @@ def parse_args():
     p.add_argument("--tags", default="anchoring,probes", help="Comma-separated tags (only for 'measurements' endpoint)")
     p.add_argument("--sort", default="-id", help="Sort order (e.g., -id or id)")
     p.add_argument("--page-size", type=int, default=500, help="Items per page (API max is usually 500)")
-    p.add_argument("--fields", default="id", help="Fields to request (use 'measurement' for anchor-measurements ID)")
+    p.add_argument("--fields", help="Comma-separated fields to request; the ID field is always included "
+                                    "(use 'measurement' for anchor-measurements ID)")
     p.add_argument("--extra", default="", help="Extra query params as JSON, e.g. '{\"status\":1}'")
     p.add_argument("--output", choices=["ids", "jsonl", "csv"], default="ids", help="Output format")
     p.add_argument("--outfile", default="-", help="Output file path or '-' for stdout")
     p.add_argument("--timeout", type=int, default=30, help="HTTP timeout seconds")
-    p.add_argument("--sleep", type=float, default=0.0, help="Optional sleep between pages (seconds)")
+    p.add_argument("--tcp-fastopen", action="store_true",
+                   help="Open connections with TCP Fast Open where the system supports it (Linux); "
+                        "--timeout then no longer limits the connect phase")
+    p.add_argument("--sleep", type=float, default=0.0, help="Optional sleep between pages (seconds); disables prefetching")
+    p.add_argument("--workers", type=int, default=8, help="Pages to fetch concurrently (1 fetches pages one at a time)")
+    p.add_argument("--partitions", type=int, default=1,
+                   help="Split the ID range into this many parts and page through them in parallel "
+                        "(only for 'measurements' endpoint sorted by id or -id)")
+    p.add_argument("--cache", default="", help="Cache pages in this file and revalidate them with ETags on later runs")
     p.add_argument("--resume-url", default="", help="Start from a previously captured 'next' URL")
-    p.add_argument("--min-id", type=int, default=0, help="Stop early when sorted by -id and ID is less than this value")
+    p.add_argument("--skip-seen", action="store_true",
+                   help="Append only IDs not written by earlier runs to --outfile instead of replacing it "
+                        "(IDs written are tracked in '<outfile>.seen')")
+    p.add_argument("--min-id", type=int, default=0, help="Stop early when sorted by -id and ID is less than this value; "
+                                                         "IDs below it are not written")
 
     key_group = p.add_argument_group('API Key Options (most secure first)')
     key_group.add_argument("--prompt-key", action="store_true", help="Prompt for API key interactively and securely.")
@@ -129,17 +245,518 @@ def get_api_key(args):
     return None
 
 
-def open_out(path):
+def open_out(path, append=False):
     """
-    Opens the given file path for writing or returns sys.stdout if path is '-'.
+    Opens the given file path, or stdout if path is '-', for writing bytes.
+
+    Output to files is buffered in large blocks so results are written with
+    few system calls. When stdout is a terminal or a pipe, a small buffer is
+    used instead so a reader sees results as the pages arrive. Closing the
+    returned object flushes it but leaves stdout open.
 
     Args:
         path (str): The file path or '-'.
+        append (bool): Add to the end of an existing file instead of replacing it.
+
+    Returns:
+        A binary file-like object ready for writing.
+    """
+    if path != "-":
+        return open(path, "ab" if append else "wb", buffering=OUT_BUFFER_SIZE)
+    fd = sys.stdout.fileno()
+    buffering = OUT_BUFFER_SIZE if stat.S_ISREG(os.fstat(fd).st_mode) else io.DEFAULT_BUFFER_SIZE
+    return open(fd, "wb", buffering=buffering, closefd=False)
+
+
+def ids_page_writer(emit, id_key):
+    """
+    Builds a page writer that emits one ID per line.
+
+    Args:
+        emit (callable): Called with the rendered bytes of each page.
+        id_key (str): The field holding the ID.
+
+    Returns:
+        callable: A function that renders and emits a list of results.
+    """
+    get_id = operator.itemgetter(id_key)
+
+    def write_page(results):
+        emit("".join([f"{get_id(item)}\n" for item in results]).encode("utf-8"))
+
+    return write_page
+
+
+def jsonl_page_writer(emit):
+    """
+    Builds a page writer that emits one JSON object per line.
+
+    Args:
+        emit (callable): Called with the rendered bytes of each page.
+
+    Returns:
+        callable: A function that renders and emits a list of results.
+    """
+    dumps = json_dumps
+
+    def write_page(results):
+        lines = [dumps(item) for item in results]
+        lines.append(b"")  # For the trailing newline
+        emit(b"\n".join(lines))
+
+    return write_page
+
+
+def csv_page_writer(emit, columns, header=True):
+    """
+    Builds a page writer that emits CSV rows, and emits the header row now.
+
+    Args:
+        emit (callable): Called with the rendered bytes of each page.
+        columns (list): The requested fields, used as the CSV columns.
+        header (bool): Emit the header row. Defaults to True.
 
     Returns:
-        A file-like object ready for writing.
+        callable: A function that renders and emits a list of results.
+    """
+    # csv.writer renders each page into a reusable text buffer
+    buf = io.StringIO(newline="")
+    writer = csv.writer(buf)
+    get_row = operator.itemgetter(*columns)
+    if len(columns) == 1:
+        get_one = get_row
+
+        def get_row(item):
+            # itemgetter returns a bare value rather than a tuple for one key
+            return (get_one(item),)
+
+    def flush():
+        emit(buf.getvalue().encode("utf-8"))
+        buf.seek(0)
+        buf.truncate()
+
+    def write_page(results):
+        try:
+            rows = [get_row(item) for item in results]
+        except KeyError:
+            # The API left out a requested field; fill in blanks
+            rows = [[item.get(c, "") for c in columns] for item in results]
+        writer.writerows(rows)
+        flush()
+
+    if header:
+        writer.writerow(columns)
+        flush()
+    return write_page
+
+
+def finish_output(tmp_path, path, digest, complete=True):
+    """
+    Moves a finished output file into place unless its contents are unchanged.
+
+    The digest of the last output written to 'path' is kept in '<path>.sha'.
+    When a complete run produces the same digest, the temp file is discarded
+    and 'path' (including its mtime) is left untouched, so downstream jobs can
+    skip re-processing it. Partial output from a failed run still replaces
+    'path', but its digest is not recorded.
+
+    Args:
+        tmp_path (str): The temp file the output was written to.
+        path (str): The final output file path.
+        digest (str): The hex digest of the output.
+        complete (bool): Whether the run fetched the whole result set.
+    """
+    sha_path = path + ".sha"
+    if not complete:
+        os.replace(tmp_path, path)
+        try:
+            os.remove(sha_path)
+        except FileNotFoundError:
+            pass
+        return
+
+    try:
+        with open(sha_path, encoding="utf-8") as f:
+            previous = f.read().strip()
+    except FileNotFoundError:
+        previous = None
+
+    if digest == previous and os.path.exists(path):
+        os.remove(tmp_path)
+        logging.info("Output unchanged, leaving %s as is.", path)
+        return
+
+    os.replace(tmp_path, path)
+    with open(sha_path, "w", encoding="utf-8") as f:
+        f.write(digest + "\n")
+
+
+class PageCache:
+    """
+    A persistent store of page bodies and their ETags, keyed by full URL.
+
+    Backed by a shelve file and safe to share between prefetch workers.
     """
-    return sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+
+    def __init__(self, path):
+        self._db = shelve.open(path)
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Returns the cached (etag, body) tuple for url, or None."""
+        with self._lock:
+            return self._db.get(url)
+
+    def put(self, url, etag, body):
+        """Stores the body and ETag of a freshly fetched page."""
+        with self._lock:
+            self._db[url] = (etag, body)
+
+    def close(self):
+        """Flushes and closes the underlying shelve file."""
+        with self._lock:
+            self._db.close()
+
+
+class SeenIds:
+    """
+    A persistent set of the integer IDs written by earlier runs.
+
+    Stored IDs are kept sorted in a packed 64-bit array, so a lookup is a
+    binary search and a million of them take 8 MB on disk and in memory. IDs
+    added during a run are held in a set until save() merges them in. Unlike
+    a bloom filter there are no false positives, so a new ID is never dropped.
+
+    Raises:
+        ValueError: If the file is not a whole number of 64-bit IDs (e.g. truncated).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._ids = array("q")
+        self._new = set()
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if len(data) % self._ids.itemsize:
+            raise ValueError(f"{path} is not a valid list of IDs ({len(data)} bytes); "
+                             f"it may be truncated")
+        self._ids.frombytes(data)
+
+    def __contains__(self, id_):
+        if id_ in self._new:
+            return True
+        i = bisect_left(self._ids, id_)
+        return i < len(self._ids) and self._ids[i] == id_
+
+    def add(self, id_):
+        """Marks an ID as written."""
+        self._new.add(id_)
+
+    def save(self):
+        """Merges this run's IDs into the file, replacing it atomically."""
+        if not self._new:
+            return
+        merged = array("q", heapq.merge(self._ids, sorted(self._new)))
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            merged.tofile(f)
+        os.replace(tmp_path, self.path)
+        self._ids, self._new = merged, set()
+
+
+def read_written_ids(path, output, id_key):
+    """
+    Reads back the IDs in an output file written by an earlier run.
+
+    Args:
+        path (str): The output file.
+        output (str): The format it was written in ('ids', 'jsonl' or 'csv').
+        id_key (str): The field the IDs were taken from.
+
+    Yields:
+        int: Each integer ID in the file.
+
+    Raises:
+        ValueError: If a line cannot be parsed in the given format.
+        KeyError: If a JSONL row or the CSV header lacks the ID field.
+    """
+    with open(path, newline="" if output == "csv" else None) as f:
+        if output == "ids":
+            values = (line.strip() for line in f if line.strip())
+        elif output == "jsonl":
+            values = (json_loads(line)[id_key] for line in f if line.strip())
+        else:
+            reader = csv.DictReader(f)
+            if id_key not in (reader.fieldnames or ()):
+                raise KeyError(id_key)
+            values = (row[id_key] for row in reader)
+        for value in values:
+            if isinstance(value, str):
+                value = int(value) if value.lstrip("-").isdigit() else None
+            if isinstance(value, int):
+                yield value
+
+
+class TransferStats:
+    """
+    Totals of bytes received over the wire and bytes of JSON they decoded to.
+
+    Safe to share between prefetch workers.
+    """
+
+    def __init__(self):
+        self.wire_bytes = 0
+        self.body_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, wire_bytes, body_bytes):
+        """Records the sizes of one downloaded page."""
+        with self._lock:
+            self.wire_bytes += wire_bytes
+            self.body_bytes += body_bytes
+
+    def log(self):
+        """Logs the totals and the compression ratio achieved."""
+        if self.wire_bytes:
+            logging.info("Downloaded %.1f KiB for %.1f KiB of JSON (compression ratio %.1fx).",
+                         self.wire_bytes / 1024, self.body_bytes / 1024, self.body_bytes / self.wire_bytes)
+
+
+def fetch_page(session, url, params, timeout, cache=None, stats=None, missing_ok=False):
+    """
+    Fetches a single page of results and decodes its JSON body.
+
+    With a cache, a previously seen page is requested conditionally with
+    If-None-Match, and a '304 Not Modified' answer is served from the cache.
+
+    Args:
+        session (requests.Session): The session to issue the request with.
+        url (str): The page URL.
+        params (dict or None): Query parameters, or None if the URL already carries them.
+        timeout (int): HTTP timeout in seconds.
+        cache (PageCache, optional): The page cache. Defaults to None.
+        stats (TransferStats, optional): Totals to record the page's size in. Defaults to None.
+        missing_ok (bool): Treat '404 Not Found' as an empty page. Defaults to False.
+
+    Returns:
+        dict: The decoded page.
+    """
+    cached = None
+    headers = None
+    if cache is not None:
+        key = requests.Request("GET", url, params=params).prepare().url
+        cached = cache.get(key)
+        if cached:
+            headers = {"If-None-Match": cached[0]}
+
+    r = session.get(url, params=params, timeout=timeout, headers=headers, stream=True)
+    # Read the body as it came off the wire (possibly compressed, with any
+    # chunked framing removed) to measure it, then let requests decode it
+    # from memory. tell() would count nothing for chunked responses.
+    raw = r.raw
+    wire = b"".join(raw.stream(decode_content=False))
+    raw.release_conn()
+    r.raw = HTTPResponse(body=io.BytesIO(wire), headers=raw.headers, status=raw.status,
+                         preload_content=False, decode_content=True)
+    if cached and r.status_code == 304:
+        return json_loads(cached[1])
+    if missing_ok and r.status_code == 404:
+        return {"results": []}
+    r.raise_for_status()  # Raise an exception for HTTP errors not handled by Retry
+
+    if stats is not None:
+        stats.add(len(wire), len(r.content))
+    etag = r.headers.get("ETag")
+    if cache is not None and etag:
+        cache.put(key, etag, r.content)
+    return json_loads(r.content)
+
+
+def iter_pages(session, url, params, args, cache=None, stats=None):
+    """
+    Yields the results of each page of a result set in order.
+
+    The first page is always fetched on its own. If it reports a total 'count',
+    the remaining pages are addressed directly with '?page=N' and up to
+    --workers of them are kept in flight at once, after which the last page's
+    'next' link is followed for any results that moved past it as the set
+    grew. Otherwise (or with --workers 1 or --sleep) the API's 'next' cursor
+    is followed one page at a time from the start.
+
+    Only each page's 'results' list is handed on and at most --workers + 1
+    pages are held at once, so memory is bounded by the page size rather than
+    by the size of the whole result set.
+
+    Args:
+        session (requests.Session): The session to issue requests with.
+        url (str): The URL of the first page.
+        params (dict or None): Query parameters for the first request.
+        args (argparse.Namespace): The parsed command-line arguments.
+        cache (PageCache, optional): The page cache. Defaults to None.
+        stats (TransferStats, optional): Totals to record page sizes in. Defaults to None.
+
+    Yields:
+        list: The results of each page.
+    """
+    logging.info("Fetching page 1...")
+    data = fetch_page(session, url, params, args.timeout, cache, stats)
+    results = data.get("results", [])
+    yield results
+
+    per_page = len(results)
+    count = data.get("count")
+    next_url = data.get("next")
+    del data, results  # Don't keep the first page alive for the whole run
+    page_count = 1
+    if args.workers > 1 and args.sleep <= 0 and params and isinstance(count, int) and per_page:
+        total_pages = math.ceil(count / per_page)
+        if total_pages > 1:
+            logging.info("Prefetching %d more pages with %d workers.", total_pages - 1, args.workers)
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            # A sliding window of futures keeps pages in order while bounding
+            # the number of requests (and decoded pages) held at any one time.
+            window = deque()
+            try:
+                while page_count < total_pages or window:
+                    # Keep one page queued behind the busy workers so none sit idle
+                    while page_count < total_pages and len(window) <= args.workers:
+                        page_count += 1
+                        logging.info("Fetching page %d...", page_count)
+                        # A page past the end (the set shrank since page 1) is just empty
+                        window.append(pool.submit(fetch_page, session, url, dict(params, page=page_count),
+                                                  args.timeout, cache, stats, missing_ok=True))
+                    data = window.popleft().result()
+                    next_url = data.get("next")
+                    yield data.get("results", [])
+            finally:
+                # Don't start pages nobody will read (e.g. after an early stop)
+                for future in window:
+                    future.cancel()
+        # If the set grew since page 1 (e.g. new measurements with sort=-id),
+        # the last counted page links to the results pushed past it; the
+        # cursor below picks those up.
+
+    # Follow the 'next' cursor
+    while next_url:
+        if args.sleep > 0:
+            logging.info("Sleeping for %s seconds.", args.sleep)
+            time.sleep(args.sleep)
+        page_count += 1
+        logging.info("Fetching page %d...", page_count)
+        # The 'next' URL already contains the query parameters
+        data = fetch_page(session, next_url, None, args.timeout, cache, stats)
+        next_url = data.get("next")
+        yield data.get("results", [])
+
+
+def fetch_id_bounds(session, url, params, args, stats=None):
+    """
+    Finds the smallest and largest ID in a result set.
+
+    Args:
+        session (requests.Session): The session to issue requests with.
+        url (str): The list endpoint URL.
+        params (dict): The query parameters of the full result set.
+        args (argparse.Namespace): The parsed command-line arguments.
+        stats (TransferStats, optional): Totals to record page sizes in. Defaults to None.
+
+    Returns:
+        tuple or None: (min_id, max_id), or None if the result set is empty.
+    """
+    bounds = []
+    for sort in ("id", "-id"):
+        probe = dict(params, sort=sort, page_size=1, fields="id")
+        results = fetch_page(session, url, probe, args.timeout, stats=stats).get("results", [])
+        if not results or not isinstance(results[0].get("id"), int):
+            return None
+        bounds.append(results[0]["id"])
+    return tuple(bounds)
+
+
+def iter_partitioned_pages(session, url, params, args, cache=None, stats=None):
+    """
+    Yields the results of a result set by paging through ID ranges in parallel.
+
+    Following 'next' links makes every page depend on the one before it. The
+    ID range is instead split into --partitions disjoint ranges with
+    'id__gte'/'id__lt' filters, and each range is paged through on its own
+    worker thread. As the ranges don't overlap, yielding them one after the
+    other in the sort direction keeps the overall order.
+
+    Each range may fetch up to PARTITION_LEAD_PAGES pages ahead of its turn
+    and then waits, so at most --partitions * PARTITION_LEAD_PAGES pages are
+    held at once, whatever the size of the result set.
+
+    Args:
+        session (requests.Session): The session to issue requests with.
+        url (str): The list endpoint URL.
+        params (dict): Query parameters for the full result set.
+        args (argparse.Namespace): The parsed command-line arguments.
+        cache (PageCache, optional): The page cache. Defaults to None.
+        stats (TransferStats, optional): Totals to record page sizes in. Defaults to None.
+
+    Yields:
+        list: The results of each non-empty page.
+    """
+    bounds = fetch_id_bounds(session, url, params, args, stats)
+    if bounds is None:
+        logging.info("No results to partition.")
+        return
+
+    descending = args.sort.strip() == "-id"
+    lo, hi = bounds[0], bounds[1] + 1
+    if descending and args.min_id:
+        lo = max(lo, args.min_id)
+    k = max(1, min(args.partitions, hi - lo))
+    edges = [lo + (hi - lo) * i // k for i in range(k + 1)]
+    ranges = list(zip(edges, edges[1:]))
+    if descending:
+        ranges.reverse()
+    logging.info("Paging through IDs %d to %d in %d partitions.", lo, hi - 1, len(ranges))
+
+    # Each partition follows its own 'next' cursor; parallelism comes from
+    # running the partitions side by side rather than prefetching within one.
+    part_args = argparse.Namespace(**dict(vars(args), workers=1))
+    stop = threading.Event()
+
+    def put(out_queue, item):
+        # Wait for room in the queue, but give up once the reader has stopped
+        while not stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fill(out_queue, part_params):
+        try:
+            for results in iter_pages(session, url, part_params, part_args, cache, stats):
+                if results and not put(out_queue, results):
+                    break
+        except Exception as e:
+            put(out_queue, e)
+        finally:
+            put(out_queue, None)  # Marks the partition as done
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        queues = []
+        for start, end in ranges:
+            part_queue = queue.Queue(maxsize=PARTITION_LEAD_PAGES)
+            pool.submit(fill, part_queue, dict(params, id__gte=start, id__lt=end))
+            queues.append(part_queue)
+        try:
+            for part_queue in queues:
+                for results in iter(part_queue.get, None):
+                    if isinstance(results, Exception):
+                        raise results
+                    yield results
+        finally:
+            # Let the remaining partitions wind down after an early stop or error
+            stop.set()
 
 
 def main():
@@ -154,7 +771,8 @@ def main():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
 
     api_key = get_api_key(args)
-    session = make_session(api_key=api_key)
+    session = make_session(api_key=api_key, pool_size=max(args.workers, args.partitions, 1),
+                           tcp_fastopen=args.tcp_fastopen)
 
     # --- Determine endpoint and the correct field name for the measurement ID ---
     if args.endpoint == "anchor-measurements":
@@ -172,80 +790,193 @@ def main():
     params = {
         "sort": args.sort,
         "page_size": args.page_size,
-        "fields": args.fields,
     }
+    if args.fields is not None:
+        params["fields"] = args.fields
 
     # Conditionally add filters that are only supported by the 'measurements' endpoint
     if args.endpoint == "measurements":
         params["type"] = args.type
         params["af"] = args.af
         params["tags"] = args.tags
+        if args.min_id and args.sort.strip() == "-id":
+            # Leave the IDs below --min-id out of the result set, so its count
+            # (and the pages prefetched from it) covers only what is needed
+            params["id__gte"] = args.min_id
 
     # Add any extra user-defined parameters
     if args.extra:
         try:
             params.update(json.loads(args.extra))
         except json.JSONDecodeError as e:
-            logging.error(f"Invalid JSON in --extra argument: {e}")
+            logging.error("Invalid JSON in --extra argument: %s", e)
             sys.exit(1)
 
+    # --- Request only the fields that are needed, always including the IDs ---
+    # This comes after --extra, which may replace the list of fields.
+    if "fields" not in params and args.output != "ids":
+        logging.warning("No --fields given; only the ID field will be requested.")
+    fields = [f.strip() for f in str(params.get("fields", "")).split(",") if f.strip()]
+    # Always include the object's own 'id' and the field the output reads IDs from
+    for key in ("id", id_key):
+        if key not in fields:
+            fields.append(key)
+    params["fields"] = ",".join(fields)
+
     url = args.resume_url if args.resume_url else base
-    out = open_out(args.outfile)
-    writer = None  # CSV writer is initialized on the first result
-    is_ids_only = (args.output == "ids")
-    page_count = 0
+    use_partitions = args.partitions > 1
+    if use_partitions and (args.endpoint != "measurements" or args.sort.strip() not in ("id", "-id")
+                           or args.resume_url):
+        logging.warning("--partitions needs the measurements endpoint sorted by id or -id and no "
+                        "--resume-url; fetching without partitions.")
+        use_partitions = False
+
+    seen = None
+    if args.skip_seen:
+        if args.outfile == "-":
+            logging.error("--skip-seen needs --outfile to keep track of the IDs written.")
+            sys.exit(1)
+        seen_path = args.outfile + ".seen"
+        has_output = os.path.exists(args.outfile) and os.path.getsize(args.outfile) > 0
+        if not has_output and os.path.exists(seen_path):
+            # The output was deleted or rotated, so its IDs must be written again
+            logging.warning("%s is missing or empty; discarding %s.", args.outfile, seen_path)
+            os.remove(seen_path)
+        try:
+            seen = SeenIds(seen_path)
+            if has_output and not os.path.exists(seen_path):
+                # Rebuild the list from the output so it isn't appended to again in full
+                logging.info("Rebuilding %s from %s.", seen_path, args.outfile)
+                for id_ in read_written_ids(args.outfile, args.output, id_key):
+                    seen.add(id_)
+                seen.save()
+        except (ValueError, KeyError) as e:
+            logging.error("Cannot use --skip-seen: %s", e)
+            sys.exit(1)
+
+    # Files are written via a temp file so unchanged output can be left alone.
+    # With --skip-seen the new IDs are appended to the file instead, so the
+    # output keeps everything written so far.
+    append = seen is not None
+    tmp_path = None if args.outfile == "-" or append else args.outfile + ".tmp"
+    existing_output = append and os.path.exists(args.outfile) and os.path.getsize(args.outfile) > 0
+    if append:
+        # The stored digest would no longer describe the appended file
+        try:
+            os.remove(args.outfile + ".sha")
+        except FileNotFoundError:
+            pass
+    out = open_out(tmp_path or args.outfile, append=append)
+    complete = False
+
+    # Every page is rendered to a single bytes buffer, which is hashed and
+    # handed to the output in one write.
+    digest = hashlib.blake2b()
+    write = out.write
+
+    def emit(buf):
+        digest.update(buf)
+        write(buf)
+
+    # The output format is fixed for the run, so its page writer is picked
+    # once here instead of branching on the format for every page. Each
+    # writer gets only the arguments it needs. The CSV columns are the
+    # requested fields, so the header is written upfront (unless appending).
+    page_writers = {
+        "ids": functools.partial(ids_page_writer, emit, id_key),
+        "jsonl": functools.partial(jsonl_page_writer, emit),
+        "csv": functools.partial(csv_page_writer, emit, fields, header=not existing_output),
+    }
+    write_page = page_writers[args.output]()
+
+    # itemgetter avoids a Python-level method call for each ID lookup.
+    # The ID field is always requested.
+    get_id = operator.itemgetter(id_key)
+    stop_on_min_id = bool(args.min_id) and args.sort.strip() == "-id"
+    cache = None
+    stats = TransferStats()
 
     try:
-        # Loop as long as the API provides a 'next' URL for pagination
-        while url:
-            page_count += 1
-            logging.info(f"Fetching page {page_count}...")
-            # Params are only sent on the first request; 'next' URL contains them
-            r = session.get(url, params=params if url == base else None, timeout=args.timeout)
-            r.raise_for_status()  # Raise an exception for HTTP errors not handled by Retry
-            data = r.json()
-            results = data.get("results", [])
-            logging.info(f"Successfully fetched {len(results)} results.")
-
-            if not results:
-                logging.info("No more results, stopping.")
-                break
-
-            # Process and write results based on the chosen output format
-            for item in results:
-                if is_ids_only:
-                    print(item.get(id_key), file=out)
-                elif args.output == "jsonl":
-                    out.write(json.dumps(item) + "\n")
-                else:  # csv
-                    if writer is None:
-                        fieldnames = sorted(item.keys())
-                        writer = csv.DictWriter(out, fieldnames=fieldnames)
-                        writer.writeheader()
-                    writer.writerow(item)
-
-            # Early stop logic for fetching recent measurements
-            if args.min_id and args.sort.strip() == "-id":
-                ids = [x.get(id_key) for x in results if isinstance(x.get(id_key), int)]
-                if ids and min(ids) < args.min_id:
-                    logging.info(f"Stopping early: found ID {min(ids)}, which is < --min-id {args.min_id}.")
+        if args.cache:
+            cache = PageCache(args.cache)
+        if use_partitions:
+            pages = iter_partitioned_pages(session, base, params, args, cache, stats)
+        else:
+            # Params are only sent on the first request; 'next' URLs contain them
+            pages = iter_pages(session, url, params if url == base else None, args, cache, stats)
+        # Closing the generator right after an early stop cancels any pages
+        # still queued before the cache and output are closed
+        with contextlib.closing(pages):
+            for results in pages:
+                logging.info("Successfully fetched %d results.", len(results))
+
+                if not results:
+                    logging.info("No more results, stopping.")
+                    break
+
+                # Early stop logic for fetching recent measurements
+                stop_id = None
+                if stop_on_min_id:
+                    if id_key == "id":
+                        # Results are sorted by descending ID, so the last one is the smallest
+                        last = get_id(results[-1])
+                        if isinstance(last, int) and last < args.min_id:
+                            stop_id = last
+                    else:
+                        # e.g. anchor 'measurement' IDs, which don't follow the sort order
+                        ids = [i for i in map(get_id, results) if isinstance(i, int)]
+                        if ids and min(ids) < args.min_id:
+                            stop_id = min(ids)
+                    if stop_id is not None:
+                        # Don't write the rows that fall below --min-id
+                        results = [x for x in results
+                                   if not (isinstance(get_id(x), int) and get_id(x) < args.min_id)]
+
+                # Drop IDs that an earlier run (or an earlier page) already wrote
+                if seen is not None:
+                    fresh = []
+                    for item in results:
+                        id_ = get_id(item)
+                        if isinstance(id_, int):
+                            if id_ in seen:
+                                continue
+                            seen.add(id_)
+                        fresh.append(item)
+                    results = fresh
+
+                if results:
+                    write_page(results)
+
+                if stop_id is not None:
+                    logging.info("Stopping early: found ID %d, which is < --min-id %d.", stop_id, args.min_id)
                     break
 
-            url = data.get("next")
-            params = {}  # Clear params after first request
-            if url and args.sleep > 0:
-                logging.info(f"Sleeping for {args.sleep} seconds.")
-                time.sleep(args.sleep)
+        complete = True
 
     except requests.exceptions.RequestException as e:
-        logging.error(f"An HTTP request failed: {e}")
+        logging.error("An HTTP request failed: %s", e)
     except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
+        logging.error("An unexpected error occurred: %s", e)
     finally:
-        # Ensure the output file is closed if it's not stdout
+        stats.log()
         logging.info("Script finished.")
-        if out is not sys.stdout:
+        if cache is not None:
+            cache.close()
+        # Flush and close the output; stdout itself is left open
+        try:
             out.close()
+            written = True
+        except OSError as e:  # e.g. BrokenPipeError when piped into 'head'
+            logging.error("Could not write the output: %s", e)
+            written = False
+        if tmp_path is not None:
+            if written:
+                finish_output(tmp_path, args.outfile, digest.hexdigest(), complete)
+            else:
+                os.remove(tmp_path)  # Keep the previous output rather than a truncated one
+        if seen is not None and written:
+            # Only record IDs as seen once they are safely in --outfile
+            seen.save()
 
 
 if __name__ == "__main__":